@@ -1,16 +1,60 @@
 import json
 import time
 import os
-from http.server import BaseHTTPRequestHandler, HTTPServer
+import atexit
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+try:
+    # orjson 直接处理 bytes，编解码比标准库快数倍；未安装时回退到 json
+    # (orjson.JSONDecodeError 是 json.JSONDecodeError 的子类，异常处理无需区分)
+    import orjson
+
+    json_loads = orjson.loads
+    json_dumps = orjson.dumps
+except ImportError:
+    json_loads = json.loads
+
+    def json_dumps(obj):
+        return json.dumps(obj).encode('utf-8')
 
 # --- 配置信息 ---
 HOST = 'localhost'
 PORT = 6800
 RPC_SECRET = 'Brokye'
+AUTH_TOKEN = f"token:{RPC_SECRET}"  # 客户端需作为第一个参数传入
 SAVE_FILE = 'aria2_links.txt'  # 保存链接的文件名
+VERBOSE = True  # 是否在控制台逐条打印捕获到的链接
+FAST_RESPONSE = True  # POST 响应使用预先拼好的响应头，与响应体一次写出
+
+# 常驻的追加写句柄：避免每次请求都重新打开/关闭文件，写入由锁保护
+_SAVE_FH = open(SAVE_FILE, 'a', encoding='utf-8', buffering=1 << 16)
+_SAVE_LOCK = threading.Lock()
+atexit.register(_SAVE_FH.close)
+
+
+# 预先拼好的 POST 响应头 (与 _set_headers 一致，外加 Content-Length)，末尾只需补上长度
+_RESPONSE_HEAD = (
+    f"{BaseHTTPRequestHandler.protocol_version} 200 OK\r\n"
+    "Content-Type: application/json\r\n"
+    "Access-Control-Allow-Origin: *\r\n"
+    "Access-Control-Allow-Methods: POST, OPTIONS\r\n"
+    "Access-Control-Allow-Headers: *\r\n"
+    "Content-Length: "
+).encode('latin-1')
 
 
 class Aria2MockHandler(BaseHTTPRequestHandler):
+    def _send_json(self, payload):
+        if not FAST_RESPONSE:
+            self._set_headers()
+            self.wfile.write(payload)
+            return
+
+        # 响应头与响应体合并为一次 write，减少系统调用与 TCP 小包
+        self.log_request(200)
+        self.wfile.write(b"".join((_RESPONSE_HEAD, str(len(payload)).encode(), b"\r\n\r\n", payload)))
+
     def _set_headers(self):
         self.send_response(200)
         self.send_header('Content-type', 'application/json')
@@ -28,14 +72,13 @@ class Aria2MockHandler(BaseHTTPRequestHandler):
         post_data = self.rfile.read(content_length)
 
         try:
-            data = json.loads(post_data.decode('utf-8'))
+            data = json_loads(post_data)
             if isinstance(data, list):
                 response_data = [self.process_request(req) for req in data]
             else:
                 response_data = self.process_request(data)
 
-            self._set_headers()
-            self.wfile.write(json.dumps(response_data).encode('utf-8'))
+            self._send_json(json_dumps(response_data))
         except json.JSONDecodeError:
             self.send_error(400, "Invalid JSON")
         except Exception as e:
@@ -48,8 +91,7 @@ class Aria2MockHandler(BaseHTTPRequestHandler):
         req_id = req.get('id')
 
         # 验证密钥: token:密钥 必须是第一个参数
-        auth_token = f"token:{RPC_SECRET}"
-        if not params or params[0] != auth_token:
+        if not params or params[0] != AUTH_TOKEN:
             print(f"❌ [拒绝] 认证失败")
             return {"jsonrpc": "2.0", "id": req_id, "error": {"code": -32602, "message": "Unauthorized"}}
 
@@ -63,16 +105,17 @@ class Aria2MockHandler(BaseHTTPRequestHandler):
                 print("-" * 50)
                 print(f"🔥 [捕获成功] {current_time} | 数量: {len(uris)}")
 
-                # 写入文件
-                saved_count = 0
-                with open(SAVE_FILE, 'a', encoding='utf-8') as f:
+                if VERBOSE:
                     for uri in uris:
                         print(f"   👉 {uri}")
-                        # 纯链接写入，一行一个，方便导入其他下载器
-                        f.write(f"{uri}\n")
-                        saved_count += 1
 
-                print(f"💾 已保存 {saved_count} 个链接到: {SAVE_FILE}")
+                # 写入文件：纯链接，一行一个，方便导入其他下载器；拼接后一次写入并落盘
+                blob = ''.join(f"{uri}\n" for uri in uris)
+                with _SAVE_LOCK:
+                    _SAVE_FH.write(blob)
+                    _SAVE_FH.flush()
+
+                print(f"💾 已保存 {len(uris)} 个链接到: {SAVE_FILE}")
                 print("-" * 50)
 
                 # 返回假 GID 表示成功
@@ -93,7 +136,9 @@ def run():
     print(f"📂 保存位置: {os.path.abspath(SAVE_FILE)}")
     print("⏳ 等待浏览器发送链接... (Ctrl+C 停止)")
 
-    server = HTTPServer((HOST, PORT), Aria2MockHandler)
+    # 每个请求在独立线程中处理，多个客户端并发推送时互不阻塞 (文件写入由 _SAVE_LOCK 保护)
+    server = ThreadingHTTPServer((HOST, PORT), Aria2MockHandler)
+    server.daemon_threads = True
     try:
         server.serve_forever()
     except KeyboardInterrupt:
@@ -1,5 +1,7 @@
 import json
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import webbrowser
 import csv
 import os  # 用于检查文件是否存在
@@ -33,13 +35,23 @@ def main():
         print(f"!!! 登录失败: {e}")
         return
 
-    headers = {
+    # 复用同一个会话：后续请求共享 TCP/TLS 连接，并对瞬时错误自动重试
+    # 创建应用/密钥的 POST 不是幂等的，只对 GET 自动重试，避免重复创建
+    session = requests.Session()
+    session.headers.update({
         "Authorization": f"Bearer {access_token}",
         "Content-Type": "application/json"
-    }
+    })
+    session.mount("https://", HTTPAdapter(max_retries=Retry(
+        total=3,
+        backoff_factor=0.5,
+        status_forcelist=[429, 500, 502, 503, 504],
+        allowed_methods=["GET"],
+        raise_on_status=False  # 重试耗尽后仍返回响应，交给下面的状态码判断处理
+    )))
 
     print(">>> 正在获取租户信息...")
-    me_resp = requests.get("https://graph.microsoft.com/v1.0/organization", headers=headers)
+    me_resp = session.get("https://graph.microsoft.com/v1.0/organization")
     if me_resp.status_code != 200:
         print(f"无法获取租户信息: {me_resp.text}")
         return
@@ -49,7 +61,7 @@ def main():
     print(">>> 正在解析 API 权限 ID...")
     graph_sp_url = "https://graph.microsoft.com/v1.0/servicePrincipals"
     params = {"$filter": "appId eq '00000003-0000-0000-c000-000000000000'"}
-    sp_resp = requests.get(graph_sp_url, headers=headers, params=params)
+    sp_resp = session.get(graph_sp_url, params=params)
 
     if sp_resp.status_code != 200 or not sp_resp.json()['value']:
         print("!!! 无法找到 Microsoft Graph 服务主体信息。")
@@ -57,14 +69,15 @@ def main():
 
     graph_sp_data = sp_resp.json()['value'][0]
     graph_app_id = graph_sp_data['appId']
-    all_roles = graph_sp_data['appRoles']
+    # 权限名 -> 角色 ID，一次建表，后续按名称 O(1) 查找
+    roles_by_value = {r['value']: r['id'] for r in graph_sp_data['appRoles']}
 
     resource_access_list = []
     for perm_name in REQUIRED_PERMISSIONS:
-        role = next((r for r in all_roles if r['value'] == perm_name), None)
-        if role:
+        role_id = roles_by_value.get(perm_name)
+        if role_id:
             resource_access_list.append({
-                "id": role['id'],
+                "id": role_id,
                 "type": "Role"
             })
             print(f"    + 已匹配权限: {perm_name}")
@@ -87,7 +100,7 @@ def main():
         ]
     }
 
-    create_resp = requests.post(create_app_url, headers=headers, json=app_payload)
+    create_resp = session.post(create_app_url, json=app_payload)
     if create_resp.status_code not in [200, 201]:
         print(f"!!! 创建应用程序失败: {create_resp.text}")
         return
@@ -107,7 +120,7 @@ def main():
         }
     }
 
-    key_resp = requests.post(add_key_url, headers=headers, json=key_payload)
+    key_resp = session.post(add_key_url, json=key_payload)
 
     if key_resp.status_code not in [200, 201]:
         print(f"!!! 创建密钥失败: {key_resp.text}")
@@ -1,5 +1,56 @@
 import re
 import os
+import mmap
+
+try:
+    # Hyperscan (JIT 编译的 DFA) 扫描大文件可达 GB/s；未安装时回退到 re 流式扫描
+    import hyperscan
+except ImportError:
+    hyperscan = None
+
+# d_ 匹配字面量，\d+ 匹配一个或多个数字 (字节模式，纯 ASCII，无需解码 UTF-8)
+D_CODE_PATTERN = re.compile(rb'[dD]_\d+')
+# 块末尾可能被截断的代码片段 (d / d_ / d_123)，需拼接到下一块再匹配
+D_CODE_TAIL_PATTERN = re.compile(rb'[dD](?:_\d*)?$')
+CHUNK_SIZE = 1 << 20  # 每次读取 1 MiB
+
+
+def iter_d_codes(f):
+    """按块流式扫描文件，逐个产出匹配到的代码 (bytes)，内存占用与文件大小无关"""
+    tail = b''
+    for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+        buf = tail + chunk
+        # 把末尾可能不完整的片段留到下一块，避免代码被块边界切断
+        cut = D_CODE_TAIL_PATTERN.search(buf)
+        end = cut.start() if cut else len(buf)
+        for m in D_CODE_PATTERN.finditer(buf, 0, end):
+            yield m.group(0)
+        tail = buf[end:]
+
+    for m in D_CODE_PATTERN.finditer(tail):
+        yield m.group(0)
+
+
+def scan_with_hyperscan(input_file, on_code):
+    """mmap 整个文件交给 Hyperscan 扫描，每个完整代码回调一次 on_code(bytes)"""
+    db = hyperscan.Database()
+    db.compile(
+        expressions=[rb'd_\d+'],
+        ids=[0],
+        flags=[hyperscan.HS_FLAG_CASELESS | hyperscan.HS_FLAG_SOM_LEFTMOST]
+    )
+
+    with open(input_file, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        size = len(mm)
+
+        def on_match(match_id, start, end, flags, context):
+            # Hyperscan 会在每个可能的结尾上报 (d_1, d_12, d_123)，只保留数字已结束的最长匹配
+            if end < size and mm[end] in b'0123456789':
+                return None
+            on_code(mm[start:end])
+            return None
+
+        db.scan(mm, match_event_handler=on_match)
 
 
 def extract_d_codes(input_file, output_file):
@@ -9,29 +60,36 @@ def extract_d_codes(input_file, output_file):
         return
 
     try:
-        # 读取文件内容
-        with open(input_file, 'r', encoding='utf-8') as f:
-            content = f.read()
-
-        # 使用正则表达式提取代码
-        # (?i) 表示忽略大小写 (匹配 d_ 和 D_)
-        # d_ 匹配字面量
-        # \d+ 匹配一个或多个数字
-        matches = re.findall(r'(?i)d_\d+', content)
-
+        # 流式读取并提取代码
         # 数据清洗：
-        # 1. m.lower() 将所有代码统一为小写 (d_xxxx)，防止 D_123 和 d_123 被视为两个不同的码
+        # 1. lower() 将所有代码统一为小写 (d_xxxx)，防止 D_123 和 d_123 被视为两个不同的码
         # 2. set() 去除重复项
+        match_count = 0
+        unique = set()
+
+        def add_code(code):
+            nonlocal match_count
+            match_count += 1
+            unique.add(code.lower())
+
+        # 空文件无法 mmap，直接走流式扫描
+        if hyperscan is not None and os.path.getsize(input_file) > 0:
+            scan_with_hyperscan(input_file, add_code)
+        else:
+            with open(input_file, 'rb') as f:
+                for code in iter_d_codes(f):
+                    add_code(code)
+
         # 3. sorted() 对结果进行排序
-        unique_codes = sorted(list(set(m.lower() for m in matches)))
+        unique_codes = sorted(unique)
 
         # 将结果写入输出文件
-        with open(output_file, 'w', encoding='utf-8') as f:
+        with open(output_file, 'wb') as f:
             for code in unique_codes:
-                f.write(code + '\n')
+                f.write(code + b'\n')
 
         print(f"处理完成！")
-        print(f"原始匹配数量: {len(matches)}")
+        print(f"原始匹配数量: {match_count}")
         print(f"去重后数量: {len(unique_codes)}")
         print(f"结果已保存至: {output_file}")
 
@@ -1,19 +1,68 @@
 import requests
-from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import argparse
 import csv
+import importlib.util
 import time
 import re
-import json
 import random
 import os
+import threading
 import unicodedata
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
 from difflib import SequenceMatcher
+from functools import lru_cache
+from itertools import repeat
+
+try:
+    # RapidFuzz (C++ 实现) 比 difflib 快得多；未安装时回退到 SequenceMatcher
+    from rapidfuzz import fuzz, process
+except ImportError:
+    fuzz = process = None
+
+try:
+    # selectolax (C 实现的 HTML 解析器) 比 BeautifulSoup 快一个数量级；未安装时回退到 bs4
+    from selectolax.parser import HTMLParser
+except ImportError:
+    HTMLParser = None
+    from bs4 import BeautifulSoup
+
+    # bs4 后端优先使用 lxml，比内置 html.parser 快数倍
+    BS_PARSER = 'lxml' if importlib.util.find_spec('lxml') else 'html.parser'
+
+try:
+    # requests-cache：把 DMM / DLsite 响应缓存到本地 SQLite，重复运行时直接命中缓存
+    from requests_cache import CachedSession
+except ImportError:
+    CachedSession = None
+
+try:
+    # orjson 解析速度约为标准库 json 的数倍；未安装时回退
+    from orjson import loads as json_loads
+except ImportError:
+    from json import loads as json_loads
 
 # =================配置部分=================
 INPUT_FILE = 'd_code.txt'
 OUTPUT_FILE = 'result.csv'
 MIN_SIMILARITY = 0.65  # 建议阈值提高到 0.65 (因为清洗后匹配度会变高)
 
+# 并发配置：线程数 / 每个站点同时在途的请求数 (防止被封 IP)
+MAX_WORKERS = 8
+DMM_CONCURRENCY = 2
+DLSITE_CONCURRENCY = 4
+# 限速配置：每个站点每秒最多请求数 / 允许的突发请求数
+DMM_RATE, DMM_BURST = 1.0, 2
+DLSITE_RATE, DLSITE_BURST = 2.0, 4
+CSV_FLUSH_EVERY = 50  # 每处理多少条写入一次 CSV
+CSV_HEADER = ['DMM原名', 'DLSite匹配标题', 'd_code', 'RJ_code', '相似度', '状态']
+# 断点续跑时视为已完成的状态；"DMM Error" 等临时错误会在下次运行时重试
+FINAL_STATUSES = {'成功', '相似度过低', '未找到'}
+HTTP_CACHE_FILE = 'http_cache.sqlite'  # HTTP 缓存文件 (需安装 requests-cache)
+HTTP_CACHE_DAYS = 7  # 缓存有效期 (天)
+
 HEADERS = {
     'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
     'Accept-Language': 'ja,en-US;q=0.9,en;q=0.8',
@@ -22,72 +71,187 @@ HEADERS = {
 DMM_COOKIES = {'age_check_done': '1', 'ckcy': '1'}
 
 
+def create_session(use_cache=True):
+    """
+    创建全局复用的会话：DMM 与 DLsite 共用连接池，避免每次请求重新握手 TCP/TLS。
+    安装了 requests-cache 且 use_cache 为真时，GET 响应会缓存到本地 SQLite。
+    """
+    if use_cache and CachedSession is not None:
+        session = CachedSession(
+            HTTP_CACHE_FILE,
+            backend='sqlite',
+            expire_after=timedelta(days=HTTP_CACHE_DAYS),
+            allowable_methods=['GET'],
+            # DLsite 的 JSONP 回调名与时间戳每次都不同，不参与缓存键计算
+            ignored_parameters=['callback', 'time', '_'],
+            stale_if_error=True
+        )
+    else:
+        session = requests.Session()
+
+    session.headers.update(HEADERS)
+    adapter = HTTPAdapter(
+        pool_connections=4,
+        pool_maxsize=16,
+        max_retries=Retry(total=2, backoff_factor=0.3, status_forcelist=[502, 503, 504])
+    )
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+# 全局会话在 main() 中解析参数后创建 (避免仅导入模块时就生成缓存文件)
+SESSION = None
+# --no-cache：跳过缓存读取，强制重新请求，新响应仍会写入缓存
+FORCE_REFRESH = False
+
+
 # ==========================================
 
+class TokenBucket:
+    """
+    线程安全的令牌桶限速器：只有实际请求速率超过 rate 时才等待，
+    而不是每次请求前都盲目 sleep
+    """
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.last = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.last) * self.rate)
+            self.last = now
+            # 令牌不足时预支一个 (可为负数)，按欠缺量计算等待时间，保证并发线程依次排队
+            self.tokens -= 1
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0
+        if wait > 0:
+            time.sleep(wait)
+
+
+# 每个站点：信号量限制同时在途的请求数，令牌桶限制请求速率
+DMM_SEMAPHORE = threading.Semaphore(DMM_CONCURRENCY)
+DLSITE_SEMAPHORE = threading.Semaphore(DLSITE_CONCURRENCY)
+DMM_BUCKET = TokenBucket(DMM_RATE, DMM_BURST)
+DLSITE_BUCKET = TokenBucket(DLSITE_RATE, DLSITE_BURST)
+
+
+def throttled_get(url, bucket, semaphore, **kwargs):
+    """
+    GET 请求：本地 HTTP 缓存中有未过期的响应时直接返回，不占用限速令牌和并发名额；
+    未命中时先按站点限速排队，再发起真实请求
+    """
+    if hasattr(SESSION, 'cache'):
+        if FORCE_REFRESH:
+            kwargs['force_refresh'] = True
+        else:
+            # only_if_cached：未命中时返回 504，不会发起网络请求
+            response = SESSION.get(url, only_if_cached=True, **kwargs)
+            if response.status_code == 200 and not response.is_expired:
+                return response
+
+    bucket.acquire()
+    with semaphore:
+        return SESSION.get(url, **kwargs)
+
 class TitleMatcher:
     """
     专门用于处理日文同人音声标题匹配的工具类
     """
 
-    def __init__(self):
-        # 1. 标签正则：匹配 【...】 或 [...]
-        self.pattern_tags = re.compile(r'【.*?】|\[.*?\]|\(.*?\)')
-        # 2. 噪声正则：匹配非文字符号
-        self.pattern_noise = re.compile(r'[\s　~～\-\:：×\.…!！\?？○●◎★☆◆◇■□△▲▽▼※＊*]')
-
-    def normalize(self, text):
-        """核心清洗逻辑"""
+    # 清洗正则 (合并为一次扫描)：
+    # 1. 标签：【...】 / [...] / (...)
+    # 2. 噪声：非文字符号
+    # 3. 助词：をがの (可选，减少语法差异)
+    PATTERN_CLEAN = re.compile(
+        r'【.*?】|\[.*?\]|\(.*?\)'
+        r'|[\s　~～\-\:：×\.…!！\?？○●◎★☆◆◇■□△▲▽▼※＊*をがの]'
+    )
+
+    @staticmethod
+    @lru_cache(maxsize=4096)
+    def normalize(text):
+        """核心清洗逻辑 (结果缓存，重复出现的标题不再重复清洗)"""
         if not text: return ""
 
         # Step 1: NFKC 标准化 (全角转半角)
         text = unicodedata.normalize('NFKC', text)
 
-        # Step 2: 移除标签 (【耳かき】等)
-        text = self.pattern_tags.sub('', text)
+        # Step 2: 一次性移除标签、噪声符号与助词
+        text = TitleMatcher.PATTERN_CLEAN.sub('', text)
 
-        # Step 3: 移除通用噪声符号
-        text = self.pattern_noise.sub('', text)
-
-        # Step 4: 日语异形词修正 (关键!)
+        # Step 3: 日语异形词修正 (关键!)
         # 将 DMM 习惯的 "癒やし" 统一为 DLsite 习惯的 "癒し"
         text = text.replace('癒やし', '癒し')
 
-        # Step 5: 移除助词 (可选，减少语法差异)
-        text = re.sub(r'[をがの]', '', text)
-
         return text.lower()
 
     def get_similarity(self, str1, str2):
         """计算清洗后的相似度"""
-        norm1 = self.normalize(str1)
+        return self.similarity_to_normalized(self.normalize(str1), str2)
+
+    def similarity_to_normalized(self, norm1, str2):
+        """norm1 为已清洗的标题 (如 DMM 标题，循环外只清洗一次)"""
         norm2 = self.normalize(str2)
         if not norm1 or not norm2: return 0.0
+        # 注意：两种后端的算法不同，分数并不完全一致 (rapidfuzz 为基于 LCS 的 Indel 相似度，
+        # SequenceMatcher 为 Ratcliff/Obershelp)，同一阈值 (MIN_SIMILARITY / 0.9) 的判定结果可能略有差异
+        if fuzz is not None:
+            return fuzz.ratio(norm1, norm2) / 100.0
         return SequenceMatcher(None, norm1, norm2).ratio()
 
+    def score_candidates(self, norm1, titles):
+        """批量计算 norm1 与一组标题的相似度，rapidfuzz 可用时一次 C 调用完成全部评分"""
+        if not norm1 or not titles: return [0.0] * len(titles)
+        if process is None:
+            return [self.similarity_to_normalized(norm1, t) for t in titles]
+
+        norms = [self.normalize(t) for t in titles]
+        # process.extract 不依赖 numpy (cdist 需要)；候选只有几十个，单线程即可
+        # processor=None 显式关闭预处理 (rapidfuzz 2.x 默认为 default_process)，与 fuzz.ratio 单条评分一致
+        # 与单条评分保持一致：清洗后为空的标题记 0 分
+        scores = [0.0] * len(norms)
+        for _, score, index in process.extract(norm1, norms, scorer=fuzz.ratio, processor=None, limit=None):
+            if norms[index]:
+                scores[index] = score / 100.0
+        return scores
+
 
 def get_dmm_title(d_code):
     """从 DMM 获取标题"""
     # 注意：这里使用的是搜索页，为了准确性，建议确认 searchstr 是否只返回唯一结果
     url = f"https://www.dmm.co.jp/search/=/searchstr={d_code}/limit=30/sort=rankprofile"
     try:
-        response = requests.get(url, headers=HEADERS, cookies=DMM_COOKIES, timeout=15)
+        response = throttled_get(url, DMM_BUCKET, DMM_SEMAPHORE, cookies=DMM_COOKIES, timeout=15)
         if response.status_code != 200: return None
-        soup = BeautifulSoup(response.text, 'html.parser')
-
-        # 尝试适配两种常见的 DMM 列表结构
-        title_tag = soup.find('p', class_="text-sm font-bold line-clamp-2")  # 现代样式
-        if not title_tag:
-            # 备用选择器 (列表样式)
-            title_tag = soup.find('span', class_="txt")
-
-        if title_tag:
-            return title_tag.get_text(strip=True)
-        return None
+        return parse_dmm_title(response.text)
     except Exception as e:
         print(f"DMM 请求错误: {e}")
         return None
 
 
+def parse_dmm_title(html):
+    """从 DMM 搜索页 HTML 中提取第一个作品标题"""
+    # 尝试适配两种常见的 DMM 列表结构：现代样式 / 备用选择器 (列表样式)
+    if HTMLParser is not None:
+        tree = HTMLParser(html)
+        node = tree.css_first('p.text-sm.font-bold.line-clamp-2') or tree.css_first('span.txt')
+        return node.text(strip=True) if node else None
+
+    soup = BeautifulSoup(html, BS_PARSER)
+    title_tag = soup.find('p', class_="text-sm font-bold line-clamp-2")
+    if not title_tag:
+        title_tag = soup.find('span', class_="txt")
+
+    if title_tag:
+        return title_tag.get_text(strip=True)
+    return None
+
+
 def generate_search_candidates(raw_title):
     """
     生成搜索关键词列表。
@@ -138,18 +302,113 @@ def get_dlsite_candidates_list(search_term):
     }
 
     try:
-        response = requests.get(base_url, params=params, headers=HEADERS, timeout=10)
+        response = throttled_get(base_url, DLSITE_BUCKET, DLSITE_SEMAPHORE, params=params, timeout=10)
         if response.status_code == 200:
-            match = re.search(r'^\s*.*?\(({.*})\);\s*$', response.text, re.DOTALL)
-            if match:
-                data = json.loads(match.group(1))
+            # 响应形如 jQueryXXXX_TS({...}); 直接截取首个 "(" 与最后一个 ")" 之间的 JSON
+            text = response.text
+            lp = text.find('(')
+            rp = text.rfind(')')
+            if lp != -1 and rp > lp:
+                data = json_loads(text[lp + 1:rp])
                 return data.get('work', [])
     except Exception as e:
         print(f"DLsite API 错误: {e}")
     return []
 
 
+def process_one(d_code, matcher):
+    """处理单个 d_code，返回要写入 CSV 的一行 (在工作线程中执行)"""
+    # DMM 限流 (最多 DMM_CONCURRENCY 个并发请求，速率不超过 DMM_RATE) 在 throttled_get 中完成，缓存命中时不限速
+    dmm_title = get_dmm_title(d_code)
+
+    # 全局最佳结果容器
+    best_match = {
+        "rj": "Not Found",
+        "title": "",
+        "score": 0.0,
+        "status": "未找到"
+    }
+
+    if dmm_title:
+        print(f"[{d_code}] 📝 DMM标题: {dmm_title[:40]}...")
+
+        search_terms = generate_search_candidates(dmm_title)
+        norm_dmm = matcher.normalize(dmm_title)
+
+        # 已评分的 RJ 号 -> 相似度，不同搜索词返回的重复候选直接跳过，不再清洗/评分
+        scored_rjs = {}
+
+        for term in search_terms:
+            # 如果已经找到了极高相似度 (>0.9)，跳过后续搜索词
+            if best_match["score"] > 0.9:
+                break
+
+            candidates_list = get_dlsite_candidates_list(term)
+
+            if not candidates_list:
+                continue
+
+            # 该搜索词返回的结果中尚未评分的候选 (按 RJ 号去重，保留首次出现)
+            new_candidates = {}
+            for item in candidates_list:
+                dl_rj = item.get('workno')
+                if dl_rj not in scored_rjs:
+                    new_candidates.setdefault(dl_rj, item)
+
+            # === 核心：使用清洗后的相似度计算 (整批一次评分) ===
+            titles = [item.get('work_name') for item in new_candidates.values()]
+            scores = matcher.score_candidates(norm_dmm, titles)
+
+            for (dl_rj, dl_title), sim in zip(zip(new_candidates, titles), scores):
+                scored_rjs[dl_rj] = sim
+
+                # 调试日志 (可选)
+                # if sim > 0.5:
+                #     print(f"       候选: {dl_rj} | 分数: {sim:.2f} | {dl_title[:15]}...")
+
+                if sim > best_match["score"]:
+                    best_match["score"] = sim
+                    best_match["rj"] = dl_rj
+                    best_match["title"] = dl_title
+                    best_match["status"] = "成功"
+
+        # 最终判定
+        if best_match["rj"] != "Not Found":
+            print(
+                f"[{d_code}] ✅ 最终选中: {best_match['rj']} | 相似度: {best_match['score']:.2f} | {best_match['title'][:20]}...")
+
+            if best_match["score"] < MIN_SIMILARITY:
+                best_match["status"] = "相似度过低"
+                print(f"[{d_code}] ⚠️ 警告: 相似度低于阈值 ({MIN_SIMILARITY})")
+        else:
+            print(f"[{d_code}] ❌ 未找到任何匹配")
+
+    else:
+        print(f"[{d_code}] ⚠️ DMM标题获取失败")
+        best_match["status"] = "DMM Error"
+        dmm_title = "Error"
+
+    return [
+        dmm_title,
+        best_match["title"],
+        d_code,
+        best_match["rj"],
+        f"{best_match['score']:.2f}",
+        best_match["status"]
+    ]
+
+
 def main():
+    global SESSION, FORCE_REFRESH
+
+    parser = argparse.ArgumentParser(description="根据 d_code 匹配 DLsite RJ 号")
+    parser.add_argument('--no-cache', action='store_true', help="不读取 HTTP 缓存，强制重新请求 (新响应仍会更新缓存)")
+    parser.add_argument('--fresh', action='store_true',
+                        help="忽略已有结果，全部重新匹配 (如调整 MIN_SIMILARITY 后)")
+    args = parser.parse_args()
+    FORCE_REFRESH = args.no_cache
+    SESSION = create_session()
+
     if not os.path.exists(INPUT_FILE):
         print(f"❌ 错误: 找不到 {INPUT_FILE}")
         return
@@ -157,95 +416,51 @@ def main():
     # 初始化匹配器
     matcher = TitleMatcher()
 
+    # 去重 (保持原顺序)
     with open(INPUT_FILE, 'r', encoding='utf-8') as f:
-        d_codes = [line.strip() for line in f if line.strip()]
-
-    print(f"🚀 开始处理 {len(d_codes)} 个条目 (集成智能清洗版)...")
-
-    with open(OUTPUT_FILE, 'w', encoding='utf-8-sig', newline='') as csvfile:
+        d_codes = list(dict.fromkeys(line.strip() for line in f if line.strip()))
+
+    # 断点续跑：结果文件已存在时，跳过其中已得出最终结果的 d_code
+    # 出错的行不保留 (重新处理后再写入)，避免同一个 d_code 出现多行
+    kept_rows = []
+    if os.path.isfile(OUTPUT_FILE) and not args.fresh:
+        with open(OUTPUT_FILE, 'r', encoding='utf-8-sig', newline='') as fh:
+            kept_rows = [row for row in csv.reader(fh)
+                         if len(row) > 5 and row[0] != 'DMM原名' and row[5] in FINAL_STATUSES]
+        if kept_rows:
+            done = {row[2] for row in kept_rows}
+            print(f"♻️ 检测到已有结果 {OUTPUT_FILE}，跳过已完成的 {len(done)} 个条目")
+            d_codes = [c for c in d_codes if c not in done]
+
+    print(f"🚀 开始处理 {len(d_codes)} 个条目 (集成智能清洗版 | 线程数: {MAX_WORKERS})...")
+
+    # 重写结果文件 (标题行 + 保留的已完成结果)：先写临时文件再替换，中途中断也不会丢失旧结果
+    tmp_file = OUTPUT_FILE + '.tmp'
+    with open(tmp_file, 'w', encoding='utf-8-sig', newline='') as fh:
+        csv.writer(fh).writerows([CSV_HEADER] + kept_rows)
+    os.replace(tmp_file, OUTPUT_FILE)
+
+    # 本次结果追加到结果文件末尾
+    with open(OUTPUT_FILE, 'a', encoding='utf-8-sig', newline='', buffering=1 << 16) as csvfile:
         writer = csv.writer(csvfile)
-        writer.writerow(['DMM原名', 'DLSite匹配标题', 'd_code', 'RJ_code', '相似度', '状态'])
-
-        for idx, d_code in enumerate(d_codes):
-            print(f"\n[{idx + 1}/{len(d_codes)}] 正在搜索: {d_code}")
-
-            dmm_title = get_dmm_title(d_code)
-
-            # 全局最佳结果容器
-            best_match = {
-                "rj": "Not Found",
-                "title": "",
-                "score": 0.0,
-                "status": "未找到"
-            }
-
-            if dmm_title:
-                print(f"    📝 DMM标题: {dmm_title[:40]}...")
-
-                search_terms = generate_search_candidates(dmm_title)
-
-                # 已检查过的 RJ 号集合，避免重复计算
-                checked_rjs = set()
-
-                for term in search_terms:
-                    # 如果已经找到了极高相似度 (>0.9)，跳过后续搜索词
-                    if best_match["score"] > 0.9:
-                        break
-
-                    candidates_list = get_dlsite_candidates_list(term)
-
-                    if candidates_list:
-                        # 遍历该搜索词返回的所有结果
-                        for item in candidates_list:
-                            dl_rj = item.get('workno')
-                            dl_title = item.get('work_name')
-
-                            if dl_rj in checked_rjs: continue
-                            checked_rjs.add(dl_rj)
-
-                            # === 核心：使用清洗后的相似度计算 ===
-                            sim = matcher.get_similarity(dmm_title, dl_title)
-
-                            # 调试日志 (可选)
-                            # if sim > 0.5:
-                            #     print(f"       候选: {dl_rj} | 分数: {sim:.2f} | {dl_title[:15]}...")
-
-                            if sim > best_match["score"]:
-                                best_match["score"] = sim
-                                best_match["rj"] = dl_rj
-                                best_match["title"] = dl_title
-                                best_match["status"] = "成功"
-
-                    time.sleep(random.uniform(0.5, 1.0))  # 随机延迟
-
-                # 最终判定
-                if best_match["rj"] != "Not Found":
-                    print(
-                        f"    ✅ 最终选中: {best_match['rj']} | 相似度: {best_match['score']:.2f} | {best_match['title'][:20]}...")
-
-                    if best_match["score"] < MIN_SIMILARITY:
-                        best_match["status"] = "相似度过低"
-                        print(f"    ⚠️ 警告: 相似度低于阈值 ({MIN_SIMILARITY})")
-                else:
-                    print("    ❌ 未找到任何匹配")
-
-            else:
-                print("    ⚠️ DMM标题获取失败")
-                best_match["status"] = "DMM Error"
-                dmm_title = "Error"
-
-            # 写入 CSV
-            writer.writerow([
-                dmm_title,
-                best_match["title"],
-                d_code,
-                best_match["rj"],
-                f"{best_match['score']:.2f}",
-                best_match["status"]
-            ])
-
-            # 这里的 sleep 是为了防止 DMM 封 IP
-            time.sleep(random.uniform(1.0, 2.0))
+
+        # 网络请求在线程池中并发执行；map 按输入顺序返回结果，CSV 只在主线程写入，无需加锁
+        with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+            pending_rows = []
+            try:
+                for idx, row in enumerate(executor.map(process_one, d_codes, repeat(matcher))):
+                    pending_rows.append(row)
+                    print(f"[{idx + 1}/{len(d_codes)}] 已完成: {row[2]}")
+
+                    # 攒够一批再写入并落盘，减少系统调用
+                    if len(pending_rows) >= CSV_FLUSH_EVERY:
+                        writer.writerows(pending_rows)
+                        csvfile.flush()
+                        pending_rows.clear()
+            finally:
+                # 正常结束、某个条目抛出异常或 Ctrl+C 中断时，都把已完成但未写入的结果落盘
+                writer.writerows(pending_rows)
+                csvfile.flush()
 
     print(f"\n🎉 处理完成，结果已保存至 {OUTPUT_FILE}")
 
@@ -1,8 +1,43 @@
 import requests
+from requests.adapters import HTTPAdapter
 import time
 import urllib.parse
 from concurrent.futures import ThreadPoolExecutor, as_completed
 import threading
+import queue
+from types import MappingProxyType
+
+try:
+    # orjson 直接解析响应 bytes，比 resp.json() (标准库 json) 快数倍；未安装时回退
+    import orjson
+
+    json_loads = orjson.loads
+    json_dumps = orjson.dumps
+except ImportError:
+    import json
+
+    json_loads = json.loads
+
+    def json_dumps(obj):
+        return json.dumps(obj).encode('utf-8')
+
+try:
+    # ijson (C 后端 yajl2_c)：流式解析大目录列表，只提取需要的字段，不为每个项目构建完整字典
+    # 纯 Python 后端反而比整体解析慢，此时与未安装一样回退到 json_loads
+    import ijson
+
+    if ijson.backend != 'yajl2_c':
+        ijson = None
+except ImportError:
+    ijson = None
+
+try:
+    # httpx + h2 (pip install "httpx[http2]")：Graph 请求走 HTTP/2，多个并发请求复用同一条连接
+    # 未安装时回退到 requests 会话
+    import httpx
+    import h2
+except ImportError:
+    httpx = None
 
 # --- 配置信息 ---
 TENANT_ID = ""
@@ -18,9 +53,13 @@ TARGET_FOLDER_PATH = "/15/Original/3001-3214"
 # 并发配置
 # 建议：如果经常丢文件，适当降低并发数反而能提高成功率
 MAX_WORKERS = 15
+FOLDER_WORKERS = 4  # 同时处理的文件夹数量
 MAX_RETRIES_PER_FOLDER = 4  # 每个文件夹校验补漏的尝试次数
+MONITOR_TIMEOUT = 300  # 每轮等待复制任务完成的最长时间 (秒)，超时则交给下一轮校验补漏
+RETRY_WAIT_BASE, RETRY_WAIT_MAX = 3, 15  # 复制未全部确认完成时，下一轮校验前的等待时间 (秒)
 
 GRAPH_BASE_URL = "https://graph.microsoft.com/v1.0"
+GRAPH_BATCH_SIZE = 20  # Graph $batch 单次最多 20 个子请求
 
 # 全局统计与锁
 stats = {
@@ -30,8 +69,35 @@ stats = {
     "folders": 0,
     "retried": 0
 }
+stats_lock = threading.Lock()  # 只保护计数器，与 print_lock 分开，避免统计被控制台输出拖慢
 print_lock = threading.Lock()
 
+# 不支持文件夹级 delta 查询的 Drive (如部分 OneDrive for Business)，直接使用完整列表
+delta_unsupported_drives = set()
+
+# 全局复用的会话：所有线程共享连接池，避免每个请求都重新握手 TCP/TLS
+# (重试由 safe_request 负责，这里不启用 urllib3 自带重试)
+SESSION = requests.Session()
+SESSION.mount("https://", HTTPAdapter(pool_connections=32, pool_maxsize=64, max_retries=0))
+
+# 登录 (Token) 专用会话：与 Graph 请求分开，刷新 Token 时复用到 login.microsoftonline.com 的长连接
+LOGIN_SESSION = requests.Session()
+LOGIN_SESSION.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=2, max_retries=0))
+
+# Graph API 专用客户端：可用时使用 HTTP/2 多路复用，否则与其他请求共用 SESSION
+if httpx is not None:
+    GRAPH_CLIENT = httpx.Client(
+        http2=True,
+        limits=httpx.Limits(max_connections=64, max_keepalive_connections=64),
+        timeout=30.0
+    )
+    NETWORK_ERRORS = (requests.exceptions.RequestException, httpx.TransportError)
+    RAW_BODY_KWARG = "content"  # httpx 发送预先序列化好的 bytes 请求体用 content=
+else:
+    GRAPH_CLIENT = SESSION
+    NETWORK_ERRORS = (requests.exceptions.RequestException,)
+    RAW_BODY_KWARG = "data"
+
 
 class TokenManager:
     """自动管理 Token 的类，过期自动刷新"""
@@ -39,35 +105,60 @@ class TokenManager:
     def __init__(self):
         self.token = None
         self.expires_at = 0
+        self._refresh_lock = threading.Lock()
+        # (token, content_type) -> 只读请求头，Token 刷新时清空
+        self._headers_cache = {}
+        # Token 请求的地址与表单体只依赖配置常量，预先编码一次
+        self._token_url = f"https://login.microsoftonline.com/{TENANT_ID}/oauth2/v2.0/token"
+        self._token_body = urllib.parse.urlencode({
+            'client_id': CLIENT_ID, 'scope': 'https://graph.microsoft.com/.default',
+            'client_secret': CLIENT_SECRET, 'grant_type': 'client_credentials'
+        })
 
     def get_token(self):
-        if not self.token or time.time() > self.expires_at - 300:
-            with print_lock:
+        # 快速路径：Token 有效时不加锁
+        if self.token and time.time() <= self.expires_at - 300:
+            return self.token
+
+        with self._refresh_lock:
+            # 双重检查：等锁期间可能已有其他线程刷新完成，避免重复请求 Token 接口
+            if not self.token or time.time() > self.expires_at - 300:
                 # print("   [系统] 正在刷新 Token...")
-                pass
-            self._refresh_token()
+                self._refresh_token()
         return self.token
 
+    def refresh_unauthorized(self, headers):
+        """
+        请求返回 401 时调用：只有请求头中的 Token 仍是当前 Token 时才刷新，
+        多个线程同时遇到 401 时只刷新一次，其余线程等待后直接使用新 Token
+        """
+        with self._refresh_lock:
+            if headers.get('Authorization') == f'Bearer {self.token}':
+                self._refresh_token()
+
     def _refresh_token(self):
-        url = f"https://login.microsoftonline.com/{TENANT_ID}/oauth2/v2.0/token"
         headers = {'Content-Type': 'application/x-www-form-urlencoded'}
-        data = {
-            'client_id': CLIENT_ID, 'scope': 'https://graph.microsoft.com/.default',
-            'client_secret': CLIENT_SECRET, 'grant_type': 'client_credentials'
-        }
         try:
-            resp = requests.post(url, headers=headers, data=data)
+            resp = LOGIN_SESSION.post(self._token_url, headers=headers, data=self._token_body, timeout=10)
             resp.raise_for_status()
             js = resp.json()
             self.token = js['access_token']
             self.expires_at = time.time() + int(js.get('expires_in', 3600))
+            self._headers_cache = {}
         except Exception as e:
             print(f"[FATAL] Token 刷新失败: {e}")
             raise e
 
     def get_headers(self, content_type=None):
-        headers = {'Authorization': f'Bearer {self.get_token()}'}
-        if content_type: headers['Content-Type'] = content_type
+        """返回缓存的只读请求头 (调用方如需修改请先复制)"""
+        token = self.get_token()
+        key = (token, content_type)
+        headers = self._headers_cache.get(key)
+        if headers is None:
+            headers = {'Authorization': f'Bearer {token}'}
+            if content_type: headers['Content-Type'] = content_type
+            headers = MappingProxyType(headers)
+            self._headers_cache[key] = headers
         return headers
 
 
@@ -76,20 +167,19 @@ token_manager = TokenManager()
 
 # --- 核心工具函数 ---
 
-def safe_request(method, url, **kwargs):
-    """带重试机制的请求封装"""
+def safe_request(method, url, body=None, **kwargs):
+    """带重试机制的请求封装，body 为已序列化好的请求体 (bytes)"""
     retries = 4
     delay = 1
 
+    if body is not None:
+        kwargs[RAW_BODY_KWARG] = body
     if 'headers' not in kwargs:
         kwargs['headers'] = token_manager.get_headers()
 
     for i in range(retries):
         try:
-            if method == 'GET':
-                resp = requests.get(url, **kwargs)
-            elif method == 'POST':
-                resp = requests.post(url, **kwargs)
+            resp = GRAPH_CLIENT.request(method, url, **kwargs)
 
             if resp.status_code == 429:
                 retry_after = int(resp.headers.get('Retry-After', delay * 2))
@@ -104,37 +194,163 @@ def safe_request(method, url, **kwargs):
                 continue
 
             if resp.status_code == 401:
-                token_manager._refresh_token()
-                kwargs['headers'] = token_manager.get_headers()
+                token_manager.refresh_unauthorized(kwargs['headers'])
+                kwargs['headers'] = token_manager.get_headers(kwargs['headers'].get('Content-Type'))
                 continue
 
             return resp
-        except requests.exceptions.RequestException as e:
+        except NETWORK_ERRORS as e:
             if i == retries - 1: raise e
             time.sleep(delay)
             delay *= 2
     return None
 
 
-def list_children_map(drive_id, item_id):
+def iter_json_events(chunks):
+    """把分块的响应体喂给 ijson 的推送式解析器，逐个产出 (prefix, event, value)"""
+    events = ijson.sendable_list()
+    parser = ijson.parse_coro(events)
+    for chunk in chunks:
+        parser.send(chunk)
+        yield from events
+        del events[:]
+    parser.close()
+    yield from events
+
+
+def parse_children_page(resp, items_map):
+    """
+    解析一页 children 响应并写入 items_map，返回下一页地址
+    使用 ijson 时每个项目只保留 id/name 以及 file/folder 标记，下游只依赖这些字段
+    """
+    if ijson is None:
+        data = json_loads(resp.content)
+        for item in data.get('value', []):
+            items_map[item['name']] = item
+        return data.get('@odata.nextLink')
+
+    if isinstance(resp, requests.Response):
+        # requests 以 stream=True 发起，边接收边解析，不需要先缓存整个响应体
+        chunks = resp.iter_content(chunk_size=64 * 1024)
+    else:
+        # httpx 的响应体已读入内存，仍可省去完整项目字典的构建
+        chunks = (resp.content,)
+
+    next_link = None
+    item = None
+    for prefix, event, value in iter_json_events(chunks):
+        if prefix == 'value.item':
+            if event == 'start_map':
+                item = {}
+            elif event == 'map_key' and (value == 'file' or value == 'folder'):
+                item[value] = {}
+            elif event == 'end_map':
+                items_map[item['name']] = item
+        elif prefix == 'value.item.id' or prefix == 'value.item.name':
+            item[prefix[11:]] = value
+        elif prefix == '@odata.nextLink':
+            next_link = value
+    return next_link
+
+
+def list_children_map(drive_id, item_id, etag=None, cached_map=None):
     """
     列出目录下所有项目，增加分页鲁棒性
+    传入上次的 etag 与 cached_map 时带 If-None-Match 请求，未变化 (304) 直接返回缓存
+    返回 (items_map, etag)；列表超过一页时不返回 etag (单页的 ETag 无法反映后续页的变化)
     """
     url = f"{GRAPH_BASE_URL}/drives/{drive_id}/items/{item_id}/children?$top=999"
     items_map = {}
-
+    new_etag = None
+    # 流式解析只对 requests 生效 (httpx 客户端的 request() 总是读完整个响应体)
+    stream_kwargs = {'stream': True} if ijson is not None and GRAPH_CLIENT is SESSION else {}
+    page_kwargs = dict(stream_kwargs)
+
+    if etag and cached_map is not None:
+        # get_headers 返回只读缓存，需复制后再添加条件请求头
+        headers = dict(token_manager.get_headers())
+        headers['If-None-Match'] = etag
+        page_kwargs['headers'] = headers
+
+    first_page = True
     while url:
-        resp = safe_request('GET', url)
+        resp = safe_request('GET', url, **page_kwargs)
+        if first_page and 'headers' in page_kwargs and resp is not None and resp.status_code == 304:
+            resp.close()
+            return cached_map, etag
         if not resp or resp.status_code != 200:
             # 如果列表获取失败，抛出异常以便外层重试
             raise Exception(f"Failed to list children: {resp.status_code if resp else 'No Resp'}")
 
-        data = resp.json()
-        for item in data.get('value', []):
-            items_map[item['name']] = item
+        try:
+            url = parse_children_page(resp, items_map)
+        finally:
+            resp.close()  # 流式响应需显式归还连接到连接池
+        if first_page and not url:
+            new_etag = resp.headers.get('ETag')
+        first_page = False
+        page_kwargs = stream_kwargs
+
+    return items_map, new_etag
+
+
+def list_children_delta(drive_id, item_id, delta_link=None):
+    """
+    通过 delta API 获取目录变化：不带 delta_link 时用 token=latest 只取得当前的 delta_link (不返回任何项目)，
+    带 delta_link 时只返回上次之后新增/删除的项目 (如异步复制刚完成的文件)
+    返回 (changes, new_delta_link)；失败或服务端要求重新同步 (410) 时返回 (None, None)
+    """
+    url = delta_link or f"{GRAPH_BASE_URL}/drives/{drive_id}/items/{item_id}/delta?token=latest"
+    changes = []
+
+    while url:
+        resp = safe_request('GET', url)
+        if resp is None or resp.status_code != 200:
+            # 只有首次请求被明确拒绝 (4xx，410 重新同步除外；或 501 未实现) 才说明该 Drive
+            # 不支持文件夹级 delta (如部分 OneDrive for Business)；5xx 重试耗尽等临时错误不影响后续文件夹
+            if delta_link is None and resp is not None and (
+                    (400 <= resp.status_code < 500 and resp.status_code != 410) or resp.status_code == 501):
+                delta_unsupported_drives.add(drive_id)
+            return None, None
+
+        data = json_loads(resp.content)
+        changes.extend(data.get('value', []))
+        if '@odata.deltaLink' in data:
+            return changes, data['@odata.deltaLink']
         url = data.get('@odata.nextLink')
 
-    return items_map
+    return changes, None
+
+
+def refresh_children_map(drive_id, item_id, items_map, delta_link, etag=None):
+    """
+    增量刷新目录列表：有 delta_link 时只合并变化部分，避免每轮重试都完整分页拉取
+    首次 (或 delta 失效时) 用 list_children_map 完整列出直接子项 (带 etag 条件请求)，
+    并同时取得 delta_link 供下一轮使用。返回 (items_map, delta_link, etag)
+    """
+    if delta_link is not None:
+        changes, new_link = list_children_delta(drive_id, item_id, delta_link)
+        if changes is not None:
+            for item in changes:
+                # delta 会返回所有子孙项目的变化，只保留直接子项
+                if item.get('parentReference', {}).get('id') != item_id:
+                    continue
+                if 'deleted' in item:
+                    items_map = {n: i for n, i in items_map.items() if i['id'] != item['id']}
+                else:
+                    items_map[item['name']] = item
+            return items_map, new_link, etag
+        # delta_link 失效 (410) 或请求失败：下面重新完整列出并取得新的 delta_link
+
+    # 不带 delta_link 的 delta 查询会返回全部子孙项目，深层目录树中代价极高，
+    # 因此先用 token=latest 只取得当前位置 (在列表之前获取，期间的变化下一轮仍能收到)
+    new_link = None
+    if drive_id not in delta_unsupported_drives:
+        _, new_link = list_children_delta(drive_id, item_id)
+
+    # 只有上次也是完整列表时才会有 etag，此时 items_map 可作为 304 的缓存
+    items_map, etag = list_children_map(drive_id, item_id, etag, items_map)
+    return items_map, new_link, etag
 
 
 def get_or_create_folder(drive_id, parent_id, folder_name):
@@ -163,18 +379,30 @@ def get_or_create_folder(drive_id, parent_id, folder_name):
 
     # 2. 已存在 (409 Conflict) -> 转为查询
     elif resp.status_code == 409:
-        # 已存在，查询 ID
-        filter_url = f"{GRAPH_BASE_URL}/drives/{drive_id}/items/{parent_id}/children?$filter=name eq '{folder_name}'"
-        search_resp = safe_request('GET', filter_url)
-
-        if search_resp and search_resp.status_code == 200:
-            val = search_resp.json().get('value')
-            if val:
-                return val[0]['id'], False
-            else:
-                print(f"   [Error] 409 冲突但无法查询到文件夹 ID: {folder_name}")
-        else:
-            print(f"   [Error] 查询已存在文件夹失败: {search_resp.status_code if search_resp else 'None'}")
+        # 已存在，按路径直接定位子项 (名称经 URL 编码，引号/空格/Unicode 均可)
+        encoded_name = urllib.parse.quote(folder_name, safe='')
+        path_url = f"{GRAPH_BASE_URL}/drives/{drive_id}/items/{parent_id}:/{encoded_name}"
+        search_resp = safe_request('GET', path_url)
+
+        if search_resp is not None and search_resp.status_code == 200:
+            return search_resp.json()['id'], False
+
+        # 路径定位失败时回退到 $filter 查询 (OData 字符串中的单引号需写成两个)
+        # 注意：requests 的 Response 在 4xx/5xx 时布尔值为 False，必须与 None 比较
+        if search_resp is not None and search_resp.status_code == 404:
+            odata_name = folder_name.replace("'", "''")
+            filter_url = f"{GRAPH_BASE_URL}/drives/{drive_id}/items/{parent_id}/children"
+            search_resp = safe_request('GET', filter_url, params={'$filter': f"name eq '{odata_name}'"})
+
+            if search_resp is not None and search_resp.status_code == 200:
+                val = search_resp.json().get('value')
+                if val:
+                    return val[0]['id'], False
+                else:
+                    print(f"   [Error] 409 冲突但无法查询到文件夹 ID: {folder_name}")
+                    return None, False
+
+        print(f"   [Error] 查询已存在文件夹失败: {search_resp.status_code if search_resp is not None else 'None'}")
 
     # 3. 其他错误 (权限、路径等) -> 打印详细报错！
     else:
@@ -186,134 +414,288 @@ def get_or_create_folder(drive_id, parent_id, folder_name):
     return None, False
 
 
-def copy_single_file_task(source_drive, file_id, target_drive, target_parent_id, file_name):
-    """单个文件复制任务"""
-    url = f"{GRAPH_BASE_URL}/drives/{source_drive}/items/{file_id}/copy"
-    payload = {
-        "parentReference": {"driveId": target_drive, "id": target_parent_id},
-        "name": file_name
-    }
+# $batch 子请求共用的请求头 (只读，所有子请求引用同一个对象)
+BATCH_SUB_HEADERS = {"Content-Type": "application/json"}
+
+
+def copy_batch_task(source_drive, file_items, parent_reference):
+    """
+    批量复制任务：通过 Graph $batch 一次提交最多 20 个文件的复制请求
+    parent_reference 为目标目录的 {"driveId", "id"}，由调用方每个文件夹构建一次后共享
+    返回 [(is_success, msg, monitor_url), ...]，与 file_items 一一对应
+    """
+    url_prefix = f"/drives/{source_drive}/items/"
+    batch_requests = [
+        {
+            "id": str(index),
+            "method": "POST",
+            "url": url_prefix + file_item['id'] + "/copy",
+            # 每个文件只需拼入 name，parentReference 与请求头都引用同一个对象
+            "body": {"parentReference": parent_reference, "name": file_item['name']},
+            "headers": BATCH_SUB_HEADERS
+        }
+        for index, file_item in enumerate(file_items)
+    ]
 
     try:
-        resp = safe_request('POST', url, json=payload, headers=token_manager.get_headers('application/json'))
-        if resp and resp.status_code == 202:
-            return True, file_name
-        else:
-            code = resp.status_code if resp else "None"
-            return False, f"{file_name} (Code: {code})"
+        resp = safe_request('POST', f"{GRAPH_BASE_URL}/$batch", body=json_dumps({"requests": batch_requests}),
+                            headers=token_manager.get_headers('application/json'))
+        if resp is None or resp.status_code != 200:
+            code = resp.status_code if resp is not None else "None"
+            return [(False, f"{f['name']} (Batch Code: {code})", None) for f in file_items]
+
+        # 子请求的响应顺序不保证与提交顺序一致，按 id 对应回文件
+        responses = {r['id']: r for r in json_loads(resp.content).get('responses', [])}
     except Exception as e:
-        return False, f"{file_name} (Err: {e})"
+        return [(False, f"{f['name']} (Err: {e})", None) for f in file_items]
+
+    results = []
+    for index, file_item in enumerate(file_items):
+        sub_resp = responses.get(str(index), {})
+        code = sub_resp.get('status')
+        if code == 202:
+            # 异步复制的进度查询地址 (Location 头)
+            headers = {k.lower(): v for k, v in (sub_resp.get('headers') or {}).items()}
+            results.append((True, file_item['name'], headers.get('location')))
+        else:
+            results.append((False, f"{file_item['name']} (Code: {code})", None))
+    return results
+
+
+def check_copy_monitor(monitor_url):
+    """
+    查询一次异步复制的监控地址，返回 (状态, retry_after)
+    状态为 'completed' / 'failed' / 'pending'；retry_after 为服务端要求的等待秒数 (没有则为 None)
+    监控地址自带授权，不能携带 Authorization 头；完成时可能返回 303 跳转到新文件，不跟随
+    """
+    try:
+        resp = SESSION.get(monitor_url, allow_redirects=False, timeout=30)
+        if resp.status_code == 303:
+            return 'completed', None
+        if resp.status_code == 429 or resp.status_code == 401 or resp.status_code >= 500:
+            # 被限流 / 临时错误：复制任务本身可能仍在进行，视为进行中，按 Retry-After 稍后再查
+            retry_after = resp.headers.get('Retry-After')
+            return 'pending', int(retry_after) if retry_after and retry_after.isdigit() else None
+        status = resp.json().get('status') if resp.status_code in (200, 202) else None
+    except (requests.exceptions.RequestException, ValueError):
+        return 'pending', None  # 网络抖动，下一轮再查
+
+    if status == 'completed':
+        return 'completed', None
+    if status in ('failed', 'deleteFailed', None):
+        return 'failed', None
+    return 'pending', None  # notStarted / inProgress 等
+
+
+def wait_copy_monitors(executor, monitor_urls):
+    """
+    按轮次并发轮询所有复制任务，直到全部结束或超时。返回是否全部确认完成
+    每轮只发起一次查询，等待期间不占用工作线程，因此同时在途的复制任务数量不受线程数限制
+    """
+    all_completed = all(monitor_urls)
+    pending = [url for url in monitor_urls if url]
+
+    delay = 0.5
+    deadline = time.time() + MONITOR_TIMEOUT
+    while pending and time.time() < deadline:
+        results = list(executor.map(check_copy_monitor, pending))
+        if any(state == 'failed' for state, _ in results):
+            all_completed = False
+        pending = [url for url, (state, _) in zip(pending, results) if state == 'pending']
+
+        # 仍有任务进行中，指数退避后再查；被限流时至少等待服务端要求的 Retry-After
+        if pending:
+            retry_after = max((ra for _, ra in results if ra), default=0)
+            time.sleep(min(max(delay, retry_after), max(deadline - time.time(), 0)))
+            delay = min(delay * 2, 10)
+
+    return all_completed and not pending
 
 
-def process_folder_robust(source_drive, source_id, target_drive, target_id, current_path):
+def process_folder_robust(executor, source_drive, source_id, target_drive, target_id, current_path):
     """
     [核心改进] 健壮的文件夹处理逻辑：校验 -> 复制 -> 再校验 -> 补漏
+    返回需要继续处理的子文件夹任务 [(source_id, target_id, path), ...]
     """
     global stats
 
     # 1. 识别需要递归的子文件夹 (只需做一次，因为文件夹结构相对固定，主要是文件容易丢)
     try:
-        source_items_map = list_children_map(source_drive, source_id)
+        source_items_map, _ = list_children_map(source_drive, source_id)
     except Exception as e:
         print(f"   [!] 无法读取源目录 {current_path}: {e}")
-        return
+        return []
 
     folders_to_recurse = [item for item in source_items_map.values() if 'folder' in item]
+    # 源目录中的文件 (源目录在处理过程中不变，只需构建一次)
+    source_files = {name: item for name, item in source_items_map.items() if 'file' in item}
 
     # 2. 循环处理文件，确保所有文件都已传输
     # 我们使用一个循环，如果在一次复制后发现还有缺失文件，就再次尝试
 
-    for attempt in range(MAX_RETRIES_PER_FOLDER):
-        # 每次循环都重新获取目标目录的文件列表，确保状态最新
-        try:
-            target_items_map = list_children_map(target_drive, target_id)
-        except Exception as e:
-            print(f"   [!] 读取目标目录失败，重试中... {e}")
-            time.sleep(2)
-            continue
-
-        files_to_copy = []
-
-        # 对比源和目标，找出缺失文件
-        for name, item in source_items_map.items():
-            if 'file' in item:
-                if name not in target_items_map:
-                    files_to_copy.append(item)
-
-        # 如果没有缺失文件，说明本文件夹同步完成，跳出循环
-        if not files_to_copy:
-            if attempt == 0:
-                pass  # 一次性成功
-            else:
-                with print_lock:
-                    print(f"   [√ 补漏成功] {current_path} (尝试 {attempt + 1} 次)")
-            break
+    # 目标目录列表跨重试轮次保留，配合 delta_link 每轮只拉取变化部分
+    target_items_map = {}
+    delta_link = None
+    target_etag = None
+    # 复制请求体中的目标位置对本文件夹的所有批次都相同，只构建一次
+    parent_reference = {"driveId": target_drive, "id": target_id}
+
+    if not source_files:
+        # 快速路径：源目录没有文件，无需校验/复制循环
+        # 有子文件夹时仍列一次目标目录，用于复用已存在的文件夹 (一次 GET 代替逐个 POST)
+        if folders_to_recurse:
+            try:
+                target_items_map, _ = list_children_map(target_drive, target_id)
+            except Exception:
+                pass  # 列表失败时逐个走 get_or_create_folder
+    else:
+        for attempt in range(MAX_RETRIES_PER_FOLDER):
+            # 每次循环都刷新目标目录的文件列表，确保状态最新
+            try:
+                target_items_map, delta_link, target_etag = refresh_children_map(
+                    target_drive, target_id, target_items_map, delta_link, target_etag
+                )
+            except Exception as e:
+                print(f"   [!] 读取目标目录失败，重试中... {e}")
+                time.sleep(2)
+                continue
 
-        # 打印状态
-        with print_lock:
-            if attempt == 0:
-                print(f"\n处理目录: {current_path}")
-                print(f"   - 待复制文件: {len(files_to_copy)} / 总文件: {len(source_items_map)}")
-            else:
-                print(f"   [重试 {attempt}] {current_path} 发现 {len(files_to_copy)} 个文件缺失，正在补漏...")
-                stats['retried'] += len(files_to_copy)
-
-        # 提交并发任务
-        with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+            # 对比源和目标，找出缺失文件 (集合差集)
+            missing_names = source_files.keys() - target_items_map.keys()
+            files_to_copy = [source_files[name] for name in missing_names]
+
+            # 如果没有缺失文件，说明本文件夹同步完成，跳出循环
+            if not files_to_copy:
+                if attempt == 0:
+                    pass  # 一次性成功
+                else:
+                    with print_lock:
+                        print(f"   [√ 补漏成功] {current_path} (尝试 {attempt + 1} 次)")
+                break
+
+            # 打印状态
+            with print_lock:
+                if attempt == 0:
+                    print(f"\n处理目录: {current_path}")
+                    print(f"   - 待复制文件: {len(files_to_copy)} / 总文件: {len(source_items_map)}")
+                else:
+                    print(f"   [重试 {attempt}] {current_path} 发现 {len(files_to_copy)} 个文件缺失，正在补漏...")
+            if attempt > 0:
+                with stats_lock:
+                    stats['retried'] += len(files_to_copy)
+
+            # 按 20 个一组打包为 $batch 请求并发提交
+            # 复用全局线程池，避免每个文件夹都创建/销毁线程
             futures = []
-            for file_item in files_to_copy:
+            for i in range(0, len(files_to_copy), GRAPH_BATCH_SIZE):
                 futures.append(
                     executor.submit(
-                        copy_single_file_task,
+                        copy_batch_task,
                         source_drive,
-                        file_item['id'],
-                        target_drive,
-                        target_id,
-                        file_item['name']
+                        files_to_copy[i:i + GRAPH_BATCH_SIZE],
+                        parent_reference
                     )
                 )
 
             # 处理结果
             success_count = 0
+            monitor_urls = []
             for future in as_completed(futures):
-                is_success, msg = future.result()
-                if is_success:
-                    success_count += 1
+                # 每个批次只加一次锁更新计数、打印一行进度，而不是每个文件都抢锁输出
+                batch_results = future.result()
+                batch_success = 0
+                last_msg = None
+                for is_success, msg, monitor_url in batch_results:
+                    if is_success:
+                        batch_success += 1
+                        monitor_urls.append(monitor_url)
+                        last_msg = msg
+                    # else: print(f"   [X] {msg}") # 保持控制台清爽，不打印单个失败
+
+                success_count += batch_success
+                with stats_lock:
+                    stats['copied'] += batch_success
+                    stats['failed'] += len(batch_results) - batch_success  # 暂时计入失败，下一轮循环会重试
+                if last_msg:
                     with print_lock:
-                        stats['copied'] += 1
-                        print(f"   [C] {msg}", end="\r")
-                else:
+                        print(f"   [C] {success_count}/{len(files_to_copy)} {last_msg}", end="\r")
+
+            # Graph API Copy 是异步的：并发轮询每个任务的监控地址，全部完成即可结束，无需固定等待
+            all_completed = wait_copy_monitors(executor, monitor_urls)
+
+            # 全部提交成功且全部确认完成 -> 本文件夹同步完成，跳过重新校验
+            if success_count == len(files_to_copy) and all_completed:
+                if attempt > 0:
                     with print_lock:
-                        stats['failed'] += 1  # 暂时计入失败，下一轮循环会重试
-                        # print(f"   [X] {msg}") # 保持控制台清爽，不打印单个失败
+                        print(f"   [√ 补漏成功] {current_path} (尝试 {attempt + 1} 次)")
+                break
 
-        # 等待服务器处理（Graph API Copy 是异步的，给它一点时间落地）
-        # 如果文件很多，API 延迟会变大
-        wait_time = 3 + (attempt * 2)
-        time.sleep(wait_time)
+            # 有任务未确认完成 (提交失败、无监控地址、超时仍在进行)：等待一段时间再重新校验，
+            # 避免立即重新列表时把仍在复制中的文件当作缺失再次提交
+            if attempt < MAX_RETRIES_PER_FOLDER - 1:
+                time.sleep(min(RETRY_WAIT_BASE + attempt * 2, RETRY_WAIT_MAX))
 
-    else:
-        # 如果循环结束（达到最大重试次数）仍有文件缺失
-        with print_lock:
-            print(f"   [!!! 警告] 目录 {current_path} 在 {MAX_RETRIES_PER_FOLDER} 次尝试后仍有文件未完成同步。")
+        else:
+            # 如果循环结束（达到最大重试次数）仍有文件缺失
+            with print_lock:
+                print(f"   [!!! 警告] 目录 {current_path} 在 {MAX_RETRIES_PER_FOLDER} 次尝试后仍有文件未完成同步。")
 
-    # 3. 递归处理子文件夹
+    # 3. 准备子文件夹任务，交给工作队列处理 (不再递归)
+    sub_tasks = []
     for folder_item in folders_to_recurse:
         folder_name = folder_item['name']
 
-        # 获取或创建目标文件夹
-        sub_target_id, is_new = get_or_create_folder(target_drive, target_id, folder_name)
+        # 目标目录列表中已有同名文件夹时直接复用，省去 POST + 409 + GET 的往返
+        existing = target_items_map.get(folder_name)
+        if existing and 'folder' in existing:
+            sub_target_id, is_new = existing['id'], False
+        else:
+            # 获取或创建目标文件夹
+            sub_target_id, is_new = get_or_create_folder(target_drive, target_id, folder_name)
         if is_new:
-            stats['folders'] += 1
+            with stats_lock:
+                stats['folders'] += 1
 
         if sub_target_id:
-            process_folder_robust(
-                source_drive,
-                folder_item['id'],
-                target_drive,
-                sub_target_id,
-                current_path + "/" + folder_name
-            )
+            sub_tasks.append((folder_item['id'], sub_target_id, current_path + "/" + folder_name))
+
+    return sub_tasks
+
+
+def sync_folder_tree(executor, source_drive, source_root_id, target_drive, target_root_id, root_path):
+    """
+    广度优先处理整棵目录树：多个工作线程从队列中取文件夹处理，
+    新发现的子文件夹放回队列，不同层级、不同分支的文件夹可以同时处理
+    """
+    folder_queue = queue.Queue()
+    folder_queue.put((source_root_id, target_root_id, root_path))
+
+    def worker():
+        while True:
+            task = folder_queue.get()
+            if task is None:
+                folder_queue.task_done()
+                return
+            try:
+                source_id, target_id, current_path = task
+                for sub_task in process_folder_robust(executor, source_drive, source_id, target_drive, target_id, current_path):
+                    folder_queue.put(sub_task)
+            except Exception as e:
+                with print_lock:
+                    print(f"   [!] 处理目录失败 {task[2]}: {e}")
+            finally:
+                folder_queue.task_done()
+
+    workers = [threading.Thread(target=worker, daemon=True) for _ in range(FOLDER_WORKERS)]
+    for t in workers:
+        t.start()
+
+    # 等待所有文件夹 (包括处理过程中新加入的子文件夹) 处理完毕，再通知工作线程退出
+    folder_queue.join()
+    for _ in workers:
+        folder_queue.put(None)
+    for t in workers:
+        t.join()
 
 
 # --- 入口函数保持大致不变 ---
@@ -350,9 +732,10 @@ def create_target_path_tree(drive_id, root_id, path_str):
 
 def main():
     start_time = time.time()
+    executor = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix="gcopy")
     try:
         print("=== 微软 Graph API 文件同步 (健壮版 v3.0) ===")
-        print(f"策略: Verify-Copy-Verify | 线程数: {MAX_WORKERS} | 重试轮次: {MAX_RETRIES_PER_FOLDER}")
+        print(f"策略: Verify-Copy-Verify | 线程数: {MAX_WORKERS} | 并行目录: {FOLDER_WORKERS} | 重试轮次: {MAX_RETRIES_PER_FOLDER}")
 
         token_manager.get_token()  # 预热 Token
 
@@ -372,8 +755,8 @@ def main():
         t_root_id = t_drive_root_resp.json()['id']
         t_start = create_target_path_tree(t_drive, t_root_id, TARGET_FOLDER_PATH)
 
-        # 开始递归处理
-        process_folder_robust(s_drive, s_root, t_drive, t_start, SOURCE_FOLDER_PATH)
+        # 开始处理整棵目录树 (全程共用一个复制线程池)
+        sync_folder_tree(executor, s_drive, s_root, t_drive, t_start, SOURCE_FOLDER_PATH)
 
         duration = time.time() - start_time
         print(f"\n\n=== 任务全部完成 ===")
@@ -388,6 +771,8 @@ def main():
         print(f"\n[程序崩溃] {e}")
         import traceback
         traceback.print_exc()
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
 
 
 if __name__ == "__main__":
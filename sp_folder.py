@@ -4,6 +4,18 @@ import time
 import math
 import re  # 引入正则模块用于提取数字
 
+try:
+    # orjson 解析/序列化比标准库 json 快数倍，文件夹列表和 $batch 请求体都较大；未安装时回退
+    import orjson
+
+    json_loads = orjson.loads
+    json_dumps = orjson.dumps
+except ImportError:
+    json_loads = json.loads
+
+    def json_dumps(obj):
+        return json.dumps(obj).encode('utf-8')
+
 # ================= 配置区域 =================
 TENANT_ID = ''
 CLIENT_ID = ''
@@ -14,11 +26,17 @@ TARGET_FOLDER_PATH = ''
 
 # ===========================================
 
+# 自然排序正则：匹配 (开头的所有字母) + (后面的所有数字)
+NAT_SORT_PATTERN = re.compile(r"^([A-Za-z]+)(\d+)")
+
+
 class SharePointCustomSortBatch:
     def __init__(self):
         self.token = None
         self.token_expires_at = 0
         self.base_url = 'https://graph.microsoft.com/v1.0'
+        # 复用同一个会话，所有请求共享 TCP/TLS 连接
+        self.session = requests.Session()
         self.get_valid_token()
 
     def get_valid_token(self):
@@ -32,7 +50,7 @@ class SharePointCustomSortBatch:
                 'scope': 'https://graph.microsoft.com/.default'
             }
             try:
-                response = requests.post(url, data=data)
+                response = self.session.post(url, data=data)
                 response.raise_for_status()
                 js = response.json()
                 self.token = js['access_token']
@@ -55,7 +73,7 @@ class SharePointCustomSortBatch:
         hostname = SITE_URL.split('/')[2]
         site_path = '/'.join(SITE_URL.split('/')[3:])
         api_url = f"{self.base_url}/sites/{hostname}:/{site_path}"
-        response = requests.get(api_url, headers=self.headers)
+        response = self.session.get(api_url, headers=self.headers)
         if response.status_code != 200:
             print(f"Error getting site ID: {response.text}")
             return None
@@ -63,14 +81,14 @@ class SharePointCustomSortBatch:
 
     def get_drive_and_folder_id(self, site_id, folder_path):
         drive_url = f"{self.base_url}/sites/{site_id}/drive"
-        drive_resp = requests.get(drive_url, headers=self.headers)
+        drive_resp = self.session.get(drive_url, headers=self.headers)
         if drive_resp.status_code != 200:
             print("无法获取 Drive ID")
             return None, None
         drive_id = drive_resp.json()['id']
 
         item_url = f"{self.base_url}/drives/{drive_id}/root:{folder_path}"
-        item_resp = requests.get(item_url, headers=self.headers)
+        item_resp = self.session.get(item_url, headers=self.headers)
         if item_resp.status_code != 200:
             print(f"Error: 找不到路径 {folder_path}")
             return None, None
@@ -84,8 +102,8 @@ class SharePointCustomSortBatch:
         print("正在拉取文件夹列表...")
         while url:
             try:
-                response = requests.get(url, headers=self.headers)
-                data = response.json()
+                response = self.session.get(url, headers=self.headers)
+                data = json_loads(response.content)
 
                 for item in data.get('value', []):
                     # 过滤掉非文件夹，和纯数字文件夹(防止移动已创建的目标组)
@@ -110,8 +128,9 @@ class SharePointCustomSortBatch:
         PJK1987 -> ('PJK', 1987)
         """
         name = folder_item['name']
-        # 正则：匹配 (开头的所有字母) + (后面的所有数字)
-        match = re.match(r"^([A-Za-z]+)(\d+)", name)
+
+        # 预编译的正则：匹配 (开头的所有字母) + (后面的所有数字)
+        match = NAT_SORT_PATTERN.match(name)
 
         if match:
             prefix = match.group(1).upper()  # 字母部分转大写，确保 RJ 和 rj 排在一起
@@ -129,19 +148,20 @@ class SharePointCustomSortBatch:
             "folder": {},
             "@microsoft.graph.conflictBehavior": "fail"
         }
-        resp = requests.post(url, headers=self.headers, json=body)
+        resp = self.session.post(url, headers=self.headers, json=body)
         if resp.status_code == 201:
             return resp.json()['id']
         elif resp.status_code == 409:
             get_url = f"{self.base_url}/drives/{drive_id}/items/{parent_item_id}:/{folder_name}"
-            return requests.get(get_url, headers=self.headers).json()['id']
+            return self.session.get(get_url, headers=self.headers).json()['id']
         return None
 
     def execute_batch(self, batch_requests):
         if not batch_requests: return
         batch_url = "https://graph.microsoft.com/v1.0/$batch"
         try:
-            requests.post(batch_url, headers=self.headers, json={"requests": batch_requests})
+            # headers 中已带 Content-Type: application/json
+            self.session.post(batch_url, headers=self.headers, data=json_dumps({"requests": batch_requests}))
         except Exception as e:
             print(f"Batch Error: {e}")
 
@@ -158,7 +178,7 @@ class SharePointCustomSortBatch:
 
         # 2. 应用自定义排序
         print("正在进行自定义排序 (字母+数字大小)...")
-        # key 传入上面的逻辑函数
+        # key 传入上面的逻辑函数 (sort 对每个元素只计算一次 key)
         all_folders.sort(key=self.custom_sort_key)
 
         # 3. 分组